@@ -0,0 +1,125 @@
+"""Write-behind recorder for users.last_login / users.last_seen.
+
+Logins and websocket frames only touch an in-memory dict; a background thread
+flushes the coalesced timestamps with one bulk UPDATE every ACTIVITY_FLUSH_SECONDS.
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, bindparam, case, cast, column, func, update, values
+
+import model
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_FLUSH_SECONDS = float(os.getenv("ACTIVITY_FLUSH_SECONDS", "10"))
+
+
+def _latest(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+def _sqlite_latest(new, old):
+    # SQLite's MAX() returns NULL if any argument is NULL
+    return case((old.is_(None), new), (new.is_(None), old), (new > old, new), else_=old)
+
+
+class ActivityRecorder:
+    def __init__(self, interval: float = ACTIVITY_FLUSH_SECONDS):
+        self.interval = interval
+        # user_id -> (last_login, last_seen)
+        self._pending: dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _record(self, user_id: int, last_login=None, last_seen=None):
+        with self._lock:
+            login, seen = self._pending.get(user_id, (None, None))
+            self._pending[user_id] = (_latest(login, last_login), _latest(seen, last_seen))
+
+    def record_login(self, user_id: int):
+        now = datetime.utcnow()
+        self._record(user_id, last_login=now, last_seen=now)
+
+    def record_seen(self, user_id: int):
+        self._record(user_id, last_seen=datetime.utcnow())
+
+    def flush(self) -> int:
+        """Write all pending activity in one statement. Returns the number of users updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [(user_id, login, seen) for user_id, (login, seen) in pending.items()]
+        db = SessionLocal()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                activity = values(
+                    column("id", Integer),
+                    column("last_login", DateTime(timezone=True)),
+                    column("last_seen", DateTime(timezone=True)),
+                    name="activity",
+                ).data(rows)
+                db.execute(
+                    update(model.User)
+                    .where(model.User.id == activity.c.id)
+                    .values(
+                        # Cast so an all-NULL column in VALUES isn't typed as text. GREATEST
+                        # ignores NULLs, so neither a missing value nor an older one buffered
+                        # by another worker moves a timestamp backwards.
+                        last_login=func.greatest(cast(activity.c.last_login, DateTime(timezone=True)), model.User.last_login),
+                        last_seen=func.greatest(cast(activity.c.last_seen, DateTime(timezone=True)), model.User.last_seen),
+                        # activity is not a profile change; keep the onupdate hook off updated_at
+                        updated_at=model.User.updated_at,
+                    )
+                )
+            else:
+                users = model.User.__table__
+                db.execute(
+                    users.update()
+                    .where(users.c.id == bindparam("user_id"))
+                    .values(
+                        last_login=_sqlite_latest(bindparam("login"), users.c.last_login),
+                        last_seen=_sqlite_latest(bindparam("seen"), users.c.last_seen),
+                        updated_at=users.c.updated_at,
+                    ),
+                    [{"user_id": user_id, "login": login, "seen": seen} for user_id, login, seen in rows],
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush activity for {len(rows)} users: {e}")
+            for user_id, login, seen in rows:
+                self._record(user_id, last_login=login, last_seen=seen)
+            return 0
+        finally:
+            db.close()
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="activity-recorder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+recorder = ActivityRecorder()
@@ -0,0 +1,39 @@
+"""add user search indexes
+
+Revision ID: 0c4b7fe8c1f0
+Revises: bf1da7435bbd
+Create Date: 2026-10-19 12:58:44.690271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0c4b7fe8c1f0'
+down_revision: Union[str, None] = 'bf1da7435bbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_TEXT = "lower(username || ' ' || coalesce(first_name, '') || ' ' || coalesce(last_name, ''))"
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Built concurrently so large users tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_search_trgm ON users "
+            f"USING gin ({SEARCH_TEXT} gin_trgm_ops) WHERE deleted_at IS NULL"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_prefix ON users "
+            "(lower(username) text_pattern_ops) WHERE deleted_at IS NULL"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_username_prefix")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_trgm")
@@ -0,0 +1,25 @@
+"""add is_admin to users
+
+Revision ID: 7fc1bb742fba
+Revises: 0c4b7fe8c1f0
+Create Date: 2026-10-19 13:31:09.284551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '7fc1bb742fba'
+down_revision: Union[str, None] = '0c4b7fe8c1f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('is_admin', sa.Boolean(), server_default='false', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'is_admin')
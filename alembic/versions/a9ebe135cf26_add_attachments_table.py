@@ -0,0 +1,41 @@
+"""add attachments table
+
+Revision ID: a9ebe135cf26
+Revises: b56d7450cdcc
+Create Date: 2026-10-19 11:41:53.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'a9ebe135cf26'
+down_revision: Union[str, None] = 'b56d7450cdcc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('attachments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('uploader_id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=255), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['uploader_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_attachments_sha256'), 'attachments', ['sha256'], unique=False)
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_messages_attachment_url'), 'messages', ['attachment_url'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_messages_attachment_url'), table_name='messages')
+    op.drop_index(op.f('ix_attachments_sha256'), table_name='attachments')
+    op.drop_table('attachments')
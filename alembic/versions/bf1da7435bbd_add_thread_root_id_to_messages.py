@@ -0,0 +1,49 @@
+"""add thread_root_id to messages
+
+Revision ID: bf1da7435bbd
+Revises: a9ebe135cf26
+Create Date: 2026-10-19 12:20:05.117630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'bf1da7435bbd'
+down_revision: Union[str, None] = 'a9ebe135cf26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('thread_root_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('messages_thread_root_id_fkey', 'messages', 'messages', ['thread_root_id'], ['id'])
+    # Backfill existing replies with the root of their reply chain
+    op.execute("""
+        WITH RECURSIVE thread AS (
+            SELECT id, id AS root_id FROM messages WHERE parent_message_id IS NULL
+            UNION ALL
+            SELECT m.id, thread.root_id FROM messages m JOIN thread ON m.parent_message_id = thread.id
+        )
+        UPDATE messages SET thread_root_id = thread.root_id
+        FROM thread
+        WHERE messages.id = thread.id AND thread.id <> thread.root_id
+    """)
+    # messages is hot: build indexes without blocking writes (outside the migration transaction)
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_messages_thread_root_id'), 'messages', ['thread_root_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_messages_parent_message_id'), 'messages', ['parent_message_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_messages_chat_id_id', 'messages', ['chat_id', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_chat_id_id', table_name='messages')
+    op.drop_index(op.f('ix_messages_parent_message_id'), table_name='messages')
+    op.drop_index(op.f('ix_messages_thread_root_id'), table_name='messages')
+    op.drop_constraint('messages_thread_root_id_fkey', 'messages', type_='foreignkey')
+    op.drop_column('messages', 'thread_root_id')
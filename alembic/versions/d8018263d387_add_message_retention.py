@@ -0,0 +1,50 @@
+"""add message retention: chats.retention_days and archived_messages
+
+Revision ID: d8018263d387
+Revises: 7fc1bb742fba
+Create Date: 2026-10-19 14:05:37.771920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = 'd8018263d387'
+down_revision: Union[str, None] = '7fc1bb742fba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('retention_days', sa.Integer(), nullable=True))
+    op.create_table('archived_messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('receiver_id', sa.Integer(), nullable=True),
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.Column('content', sa.String(length=2000), nullable=False),
+    sa.Column('message_type', postgresql.ENUM('TEXT', 'IMAGE', 'FILE', name='messagetype', create_type=False), nullable=False),
+    sa.Column('attachment_url', sa.String(length=255), nullable=True),
+    sa.Column('parent_message_id', sa.Integer(), nullable=True),
+    sa.Column('thread_root_id', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_archived_messages_sender_id'), 'archived_messages', ['sender_id'], unique=False)
+    op.create_index(op.f('ix_archived_messages_chat_id'), 'archived_messages', ['chat_id'], unique=False)
+    with op.get_context().autocommit_block():
+        op.create_index('ix_messages_chat_id_timestamp', 'messages', ['chat_id', 'timestamp', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_chat_id_timestamp', table_name='messages')
+    op.drop_index(op.f('ix_archived_messages_chat_id'), table_name='archived_messages')
+    op.drop_index(op.f('ix_archived_messages_sender_id'), table_name='archived_messages')
+    op.drop_table('archived_messages')
+    op.drop_column('chats', 'retention_days')
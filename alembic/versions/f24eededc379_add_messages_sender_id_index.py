@@ -0,0 +1,27 @@
+"""add messages (sender_id, timestamp, id) index for user purges
+
+Revision ID: f24eededc379
+Revises: d8018263d387
+Create Date: 2026-10-19 16:20:11.402318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'f24eededc379'
+down_revision: Union[str, None] = 'd8018263d387'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_messages_sender_id_timestamp', 'messages', ['sender_id', 'timestamp', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_sender_id_timestamp', table_name='messages')
@@ -0,0 +1,50 @@
+"""Pool checkout load test.
+
+Runs N threads that each check out a connection, hold it for HOLD_MS (simulating a
+request's query time) and return it. Checkout wait stays near zero until the number
+of concurrent callers exceeds pool_size + max_overflow; past that it grows with the
+queue. Run with the same DATABASE_* environment the workers use, e.g.
+
+    DATABASE_URL=sqlite:////tmp/bench.db DATABASE_POOL_SIZE=5 DATABASE_MAX_OVERFLOW=5 python bench_pool.py
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+import database
+
+HOLD_MS = float(os.getenv("HOLD_MS", "20"))
+ROUNDS = int(os.getenv("ROUNDS", "20"))
+CONCURRENCY_LEVELS = [int(n) for n in os.getenv("CONCURRENCY", "1,2,5,10,15,20,30,50").split(",")]
+
+
+def worker():
+    for _ in range(ROUNDS):
+        with database.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            time.sleep(HOLD_MS / 1000)
+
+
+def run(concurrency: int) -> dict:
+    database.engine.dispose()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stats = database.pool_stats(database.engine)
+    stats["throughput"] = round(concurrency * ROUNDS / elapsed, 1)
+    return stats
+
+
+if __name__ == "__main__":
+    database.init_engine()
+    print(f"pool_size={database.POOL_SIZE} max_overflow={database.POOL_MAX_OVERFLOW} hold={HOLD_MS}ms")
+    print(f"{'threads':>8} {'req/s':>8} {'wait avg ms':>12} {'wait max ms':>12} {'timeouts':>9}")
+    for concurrency in CONCURRENCY_LEVELS:
+        stats = run(concurrency)
+        print(f"{concurrency:>8} {stats['throughput']:>8} {stats['wait_avg_ms']:>12} {stats['wait_max_ms']:>12} {stats['timeouts']:>9}")
@@ -0,0 +1,92 @@
+"""Cold-start benchmark: import time and time to first served request.
+
+Each measurement runs in a fresh interpreter. Exits non-zero when a median
+exceeds its budget, so it can run in CI as a regression check:
+
+    python bench_startup.py
+    IMPORT_BUDGET_MS=400 FIRST_REQUEST_BUDGET_MS=2000 RUNS=7 python bench_startup.py
+
+A temporary SQLite database is used unless DATABASE_URL is set.
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RUNS = int(os.getenv("RUNS", "5"))
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+CREATE_APP_BUDGET_MS = float(os.getenv("CREATE_APP_BUDGET_MS", "2500"))
+FIRST_REQUEST_BUDGET_MS = float(os.getenv("FIRST_REQUEST_BUDGET_MS", "5000"))
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MEASURE_IMPORT = """
+import time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app()
+built = time.perf_counter()
+print((imported - start) * 1000, (built - imported) * 1000)
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_startup.db')}")
+    return env
+
+
+def measure_import() -> tuple:
+    out = subprocess.run(
+        [sys.executable, "-c", MEASURE_IMPORT], cwd=HERE, env=_env(), capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(out[0]), float(out[1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_request() -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/metrics/pool"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "main:create_app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("server exited before serving a request")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    imports, builds = zip(*(measure_import() for _ in range(RUNS)))
+    first_requests = [measure_first_request() for _ in range(RUNS)]
+    results = [
+        ("import main", statistics.median(imports), IMPORT_BUDGET_MS),
+        ("create_app()", statistics.median(builds), CREATE_APP_BUDGET_MS),
+        ("first request", statistics.median(first_requests), FIRST_REQUEST_BUDGET_MS),
+    ]
+    failed = False
+    for name, median, budget in results:
+        status = "ok" if median <= budget else "OVER BUDGET"
+        failed = failed or median > budget
+        print(f"{name:<14} median {median:8.1f} ms   budget {budget:8.1f} ms   {status}")
+    sys.exit(1 if failed else 0)
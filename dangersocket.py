@@ -2,11 +2,23 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.orm import Session
 from database import get_db
 import model, schema
+import activity
+import presence
 from routes.auth import get_current_user
+from routes.messages import resolve_thread_root
+from routes.utils.limiter import limiter
 from datetime import datetime
+import os
+import uuid
 
 router = APIRouter(prefix='/websocket', tags=['websocket'])
 
+# Per socket, and per user across all of their sockets on every worker
+WS_CONNECTION_RATE_LIMIT = os.getenv("WS_CONNECTION_RATE_LIMIT", "10/second")
+WS_USER_RATE_LIMIT = os.getenv("WS_USER_RATE_LIMIT", "20/second")
+# Heartbeat and typing frames, per socket; frames over the limit are dropped silently
+WS_PRESENCE_RATE_LIMIT = os.getenv("WS_PRESENCE_RATE_LIMIT", "5/second")
+
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -23,25 +35,58 @@ async def websocket_endpoint(
         return
 
     chat_id = int(websocket.query_params.get("chat_id"))
-    chat = db.query(model.Chat).filter(model.Chat.id == chat_id).first()
-    if not chat:
+    is_member = (
+        db.query(model.chat_participants.c.chat_id)
+        .filter(model.chat_participants.c.chat_id == chat_id, model.chat_participants.c.user_id == current_user.id)
+        .first()
+    )
+    if is_member is None:
         await websocket.close(code=1008)
         return
 
+    connection_key = f"ws:conn:{uuid.uuid4().hex}"
+    presence_key = f"ws:presence:{connection_key}"
+    user_key = f"ws:user:{current_user.id}"
     try:
+        await websocket.send_json(presence.service.connect(chat_id, current_user.id, websocket))
         while True:
             data = await websocket.receive_json()
+            # Presence frames stay in memory and are broadcast coalesced by presence.service
+            frame_type = data.get("type")
+            if frame_type in ("heartbeat", "typing"):
+                if limiter.hit(presence_key, WS_PRESENCE_RATE_LIMIT):
+                    continue
+                activity.recorder.record_seen(current_user.id)
+                if frame_type == "heartbeat":
+                    presence.service.heartbeat(chat_id, current_user.id)
+                else:
+                    presence.service.typing(chat_id, current_user.id, bool(data.get("is_typing", True)))
+                continue
+            activity.recorder.record_seen(current_user.id)
+            if limiter.hit(connection_key, WS_CONNECTION_RATE_LIMIT) or limiter.hit(user_key, WS_USER_RATE_LIMIT):
+                await websocket.send_json({"error": "Rate limit exceeded, message dropped"})
+                continue
+            try:
+                thread_root_id = resolve_thread_root(db, chat_id, data.get("parent_message_id"))
+            except LookupError:
+                await websocket.send_json({"error": "Parent message not found"})
+                continue
             message = model.Message(
                 sender_id=current_user.id,
                 receiver_id=data["receiver_id"],
                 chat_id=chat_id,
                 content=data["content"],
                 message_type=data.get("message_type", schema.MessageType.TEXT),
+                parent_message_id=data.get("parent_message_id"),
+                thread_root_id=thread_root_id,
                 timestamp=datetime.utcnow()
             )
             db.add(message)
             db.commit()
+            presence.service.typing(chat_id, current_user.id, False)
 
             await websocket.send_json({"message": "Message sent", "content": data["content"]})
     except WebSocketDisconnect:
         print(f"User {current_user.email} disconnected")
+    finally:
+        presence.service.disconnect(chat_id, current_user.id, websocket)
@@ -1,26 +1,78 @@
-from routes import users,auth, messages, chats
-from fastapi.middleware.cors import CORSMiddleware
-import dangersocket
+import os
+import sys
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from socketio import AsyncServer, ASGIApp
 
 
-app = FastAPI()
+def _shutdown_provisioning():
+    # Only imported by the first bulk import; don't pull it in just to shut it down
+    provisioning = sys.modules.get("provisioning")
+    if provisioning is not None:
+        provisioning.shutdown_pool()
+
+
+def create_app() -> FastAPI:
+    """Build the application: engines, routers and background workers.
+
+    Route modules and the workers they pull in are imported here rather than at
+    module import, so `import main` stays cheap and nothing touches the database
+    until an app is actually built. Serve with `uvicorn main:app` or
+    `uvicorn --factory main:create_app`.
+    """
+    import database
+
+    database.init_engine()
+
+    from routes import users, auth, messages, chats, metrics, attachments, admin
+    import dangersocket
+    import activity
+    import revocation
+    import storage
+    import retention
+    import presence
+
+    app = FastAPI()
+
+    app.add_event_handler("startup", activity.recorder.start)
+    app.add_event_handler("shutdown", activity.recorder.stop)
+    app.add_event_handler("startup", revocation.store.start)
+    app.add_event_handler("shutdown", revocation.store.stop)
+    app.add_event_handler("shutdown", storage.store.shutdown)
+    app.add_event_handler("shutdown", _shutdown_provisioning)
+    app.add_event_handler("startup", retention.worker.start)
+    app.add_event_handler("shutdown", retention.worker.stop)
+    app.add_event_handler("startup", presence.service.start)
+    app.add_event_handler("shutdown", presence.service.stop)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://192.168.43.219:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "http://192.168.43.219:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[database.READ_YOUR_WRITES_HEADER],
+    )
+    app.add_middleware(database.ReadYourWritesMiddleware)
+    if os.getenv("PROFILE_HEADER_SECRET"):
+        import profiler
 
+        app.add_middleware(profiler.RequestProfilerMiddleware, secret=os.environ["PROFILE_HEADER_SECRET"])
 
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    app.include_router(chats.router)
+    app.include_router(messages.router)
+    app.include_router(attachments.router)
+    app.include_router(dangersocket.router)
+    app.include_router(metrics.router)
+    app.include_router(admin.router)
+    return app
 
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(chats.router)
-app.include_router(messages.router)
-app.include_router(dangersocket.router)
 
+def __getattr__(name):
+    # `uvicorn main:app` keeps working; the app is only built when first asked for
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(name)
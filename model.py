@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime, Enum as SqlEnum, Table
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Boolean, DateTime, Enum as SqlEnum, Table
 from sqlalchemy.sql import func
 from sqlalchemy.orm import declarative_base, Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import CITEXT  # Optional: for PostgreSQL
@@ -6,8 +6,6 @@ from typing import Optional
 import enum
 from database import Base
 from datetime import datetime
-from fastapi import WebSocket, Depends
-from sqlalchemy.orm import Session
 
 # Association table for many-to-many relationship between User and Chat
 chat_participants = Table(
@@ -44,10 +42,14 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(128), nullable=False)
     gender: Mapped[Optional[Gender]] = mapped_column(SqlEnum(Gender), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    is_admin: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false", nullable=False)
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
     last_login: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_seen: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
     deleted_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Bumped to revoke every token issued to the user so far
+    token_generation: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     
     # Relationships
     chats = relationship("Chat", secondary=chat_participants, back_populates="participants")
@@ -60,6 +62,28 @@ class User(Base):
     )
 
 
+# Lower-cased "username first last", the haystack for directory search
+user_search_text = func.lower(
+    User.username + " " + func.coalesce(User.first_name, "") + " " + func.coalesce(User.last_name, "")
+)
+
+# Trigram index for fuzzy and infix matches, btree text_pattern_ops for username prefixes.
+# Both skip soft-deleted users, which search never returns.
+Index(
+    "ix_users_search_trgm",
+    user_search_text.label("search_text"),
+    postgresql_using="gin",
+    postgresql_ops={"search_text": "gin_trgm_ops"},
+    postgresql_where=User.deleted_at.is_(None),
+)
+Index(
+    "ix_users_username_prefix",
+    func.lower(User.username).label("username_lower"),
+    postgresql_ops={"username_lower": "text_pattern_ops"},
+    postgresql_where=User.deleted_at.is_(None),
+)
+
+
 class Chat(Base):
     __tablename__ = "chats"
     
@@ -67,6 +91,8 @@ class Chat(Base):
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     chat_type: Mapped[ChatType] = mapped_column(SqlEnum(ChatType), nullable=False, default=ChatType.DIRECT)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Messages older than this many days are archived by the retention worker; NULL keeps them forever
+    retention_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     
     # Relationships
     participants = relationship("User", secondary=chat_participants, back_populates="chats")
@@ -82,8 +108,10 @@ class Message(Base):
     chat_id: Mapped[int] = mapped_column(Integer, ForeignKey("chats.id"), nullable=False)  # 🔑 ADDED THIS LINE
     content: Mapped[str] = mapped_column(String(2000), nullable=False)
     message_type: Mapped[MessageType] = mapped_column(SqlEnum(MessageType), nullable=False, default=MessageType.TEXT)
-    attachment_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
-    parent_message_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("messages.id"), nullable=True)
+    attachment_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, index=True)
+    parent_message_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("messages.id"), nullable=True, index=True)
+    # First message of the reply thread, NULL for messages that are not replies
+    thread_root_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("messages.id"), nullable=True, index=True)
     timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     is_read: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     
@@ -93,5 +121,54 @@ class Message(Base):
     chat: Mapped["Chat"] = relationship("Chat", back_populates="messages")
     
     # Self-referential relationship for reply messages
-    parent_message: Mapped[Optional["Message"]] = relationship("Message", remote_side=[id])
-    
\ No newline at end of file
+    parent_message: Mapped[Optional["Message"]] = relationship("Message", remote_side=[id], foreign_keys=[parent_message_id])
+
+    __table_args__ = (
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+        Index("ix_messages_chat_id_timestamp", "chat_id", "timestamp", "id"),
+        Index("ix_messages_sender_id_timestamp", "sender_id", "timestamp", "id"),
+    )
+
+
+class TokenRevocation(Base):
+    """Append-only log of revoked token ids and per-user generation bumps."""
+    __tablename__ = "token_revocations"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    jti: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    generation: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ArchivedMessage(Base):
+    """Messages moved out of the hot table by the retention worker. No foreign keys,
+    so archived rows never block purging users or chats."""
+    __tablename__ = "archived_messages"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sender_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    receiver_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    chat_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    content: Mapped[str] = mapped_column(String(2000), nullable=False)
+    message_type: Mapped[MessageType] = mapped_column(SqlEnum(MessageType), nullable=False)
+    attachment_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    parent_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    thread_root_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    is_read: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class Attachment(Base):
+    """Metadata for an uploaded file; the bytes live in the object store under sha256."""
+    __tablename__ = "attachments"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    uploader_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    content_type: Mapped[str] = mapped_column(String(255), nullable=False)
+    filename: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,210 @@
+"""Per-worker presence and typing indicators for websocket chats.
+
+Heartbeat and typing frames only update in-memory expiry times; nothing is
+written to the database. Changes mark their chat dirty, and a flush task on the
+event loop sends each dirty chat one coalesced "presence" frame per
+PRESENCE_BROADCAST_SECONDS, however many updates arrived in between. Frames
+carry deltas (who came online, went offline, started or stopped typing), so
+their size follows the changes rather than the chat's member count. Each socket
+has at most one frame in flight: a socket still busy with the last one is
+skipped and sent a fresh snapshot once it catches up, so slow readers never
+build up a queue.
+
+State covers sockets connected to this worker only: a user counts as online in
+a chat while one of their sockets there has sent a frame within PRESENCE_TTL_SECONDS.
+"""
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_TTL_SECONDS = float(os.getenv("PRESENCE_TTL_SECONDS", "45"))
+TYPING_TTL_SECONDS = float(os.getenv("TYPING_TTL_SECONDS", "6"))
+PRESENCE_BROADCAST_SECONDS = float(os.getenv("PRESENCE_BROADCAST_SECONDS", "1"))
+# Typists tracked per chat; further typing frames in a busy chat are ignored until one stops
+MAX_TYPING_PER_CHAT = int(os.getenv("MAX_TYPING_PER_CHAT", "20"))
+# User ids listed per field of a frame; the rest are only counted
+MAX_USERS_PER_FRAME = int(os.getenv("MAX_USERS_PER_FRAME", "200"))
+
+
+class _ChatState:
+    __slots__ = ("sockets", "online", "typing", "came_online", "went_offline", "typing_changed", "stale")
+
+    def __init__(self):
+        # websocket -> user_id
+        self.sockets: dict = {}
+        # user_id -> unix expiry
+        self.online: dict[int, float] = {}
+        self.typing: dict[int, float] = {}
+        # pending changes since the last broadcast
+        self.came_online: set[int] = set()
+        self.went_offline: set[int] = set()
+        self.typing_changed = False
+        # sockets that missed a frame and need a full snapshot
+        self.stale: set = set()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.came_online or self.went_offline or self.typing_changed)
+
+
+def _capped(user_ids) -> dict:
+    user_ids = sorted(user_ids)
+    return {"user_ids": user_ids[:MAX_USERS_PER_FRAME], "count": len(user_ids)}
+
+
+class PresenceService:
+    def __init__(self, interval: float = PRESENCE_BROADCAST_SECONDS):
+        self.interval = interval
+        self._chats: dict[int, _ChatState] = {}
+        # websocket -> task sending it the last frame
+        self._inflight: dict = {}
+        self._task = None
+
+    def _snapshot(self, chat_id: int, chat: _ChatState) -> dict:
+        return {
+            "type": "presence",
+            "chat_id": chat_id,
+            "online": _capped(chat.online),
+            "typing": _capped(chat.typing),
+        }
+
+    def connect(self, chat_id: int, user_id: int, websocket) -> dict:
+        """Register a socket and mark its user online. Returns a snapshot frame for it."""
+        chat = self._chats.setdefault(chat_id, _ChatState())
+        chat.sockets[websocket] = user_id
+        self._mark_online(chat, user_id)
+        return self._snapshot(chat_id, chat)
+
+    def disconnect(self, chat_id: int, user_id: int, websocket):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return
+        chat.sockets.pop(websocket, None)
+        chat.stale.discard(websocket)
+        if user_id not in chat.sockets.values():
+            self._mark_offline(chat, user_id)
+        if not chat.sockets:
+            del self._chats[chat_id]
+
+    def heartbeat(self, chat_id: int, user_id: int):
+        chat = self._chats.get(chat_id)
+        if chat is not None:
+            self._mark_online(chat, user_id)
+
+    def typing(self, chat_id: int, user_id: int, is_typing: bool = True):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return
+        self._mark_online(chat, user_id)
+        if is_typing:
+            if user_id not in chat.typing:
+                if len(chat.typing) >= MAX_TYPING_PER_CHAT:
+                    return
+                chat.typing_changed = True
+            chat.typing[user_id] = time.monotonic() + TYPING_TTL_SECONDS
+        elif chat.typing.pop(user_id, None) is not None:
+            chat.typing_changed = True
+
+    def _mark_online(self, chat: _ChatState, user_id: int):
+        if user_id not in chat.online:
+            if user_id in chat.went_offline:
+                chat.went_offline.discard(user_id)
+            else:
+                chat.came_online.add(user_id)
+        chat.online[user_id] = time.monotonic() + PRESENCE_TTL_SECONDS
+
+    def _mark_offline(self, chat: _ChatState, user_id: int):
+        if chat.online.pop(user_id, None) is not None:
+            if user_id in chat.came_online:
+                chat.came_online.discard(user_id)
+            else:
+                chat.went_offline.add(user_id)
+        if chat.typing.pop(user_id, None) is not None:
+            chat.typing_changed = True
+
+    def _expire(self, chat: _ChatState, now: float):
+        for user_id in [u for u, expires in chat.online.items() if expires <= now]:
+            self._mark_offline(chat, user_id)
+        for user_id in [u for u, expires in chat.typing.items() if expires <= now]:
+            del chat.typing[user_id]
+            chat.typing_changed = True
+
+    def _take_frame(self, chat_id: int, chat: _ChatState) -> dict:
+        frame = {
+            "type": "presence",
+            "chat_id": chat_id,
+            "came_online": _capped(chat.came_online),
+            "went_offline": _capped(chat.went_offline),
+            "typing": _capped(chat.typing),
+        }
+        chat.came_online = set()
+        chat.went_offline = set()
+        chat.typing_changed = False
+        return frame
+
+    async def _send(self, websocket, frame: dict):
+        try:
+            await websocket.send_json(frame)
+        except Exception:
+            # The socket's own receive loop notices a dead peer and disconnects it
+            pass
+
+    def _dispatch(self, websocket, frame: dict):
+        task = asyncio.get_running_loop().create_task(self._send(websocket, frame))
+        self._inflight[websocket] = task
+        task.add_done_callback(lambda _: self._inflight.pop(websocket, None))
+
+    def flush(self) -> int:
+        """Expire stale entries and start one frame per changed chat. Returns the number of chats sent to.
+
+        Must be called on the event loop; sends run as tasks and are not awaited.
+        """
+        now = time.monotonic()
+        sent = 0
+        for chat_id, chat in list(self._chats.items()):
+            self._expire(chat, now)
+            frame = self._take_frame(chat_id, chat) if chat.dirty else None
+            if frame is None and not chat.stale:
+                continue
+            snapshot = None
+            for websocket in list(chat.sockets):
+                if websocket in self._inflight:
+                    if frame is not None:
+                        chat.stale.add(websocket)
+                elif websocket in chat.stale:
+                    chat.stale.discard(websocket)
+                    snapshot = snapshot or self._snapshot(chat_id, chat)
+                    self._dispatch(websocket, snapshot)
+                elif frame is not None:
+                    self._dispatch(websocket, frame)
+            sent += frame is not None
+        return sent
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Presence flush failed: {e}")
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+
+
+service = PresenceService()
@@ -0,0 +1,140 @@
+"""On-demand statistical profiler for a live worker.
+
+A Sampler thread wakes every `interval` seconds, snapshots every other thread's
+Python stack with sys._current_frames() and counts identical stacks. Output is
+the collapsed-stack format read by flamegraph.pl, speedscope and inferno:
+
+    main (main.py:12);login (auth.py:70);verify (bcrypt.py:300) 42
+
+Nothing is installed while no profile is running, so the idle cost is zero.
+Per-request profiling is opt-in through PROFILE_HEADER_SECRET: requests sent
+with `X-Profile: <secret>` are sampled and their stacks filed under the route.
+Only the event-loop thread and threadpool threads running work for that request
+are sampled. Stacks parked in an idle wait (an event, a queue, the selector) are
+dropped in both modes.
+"""
+import contextvars
+import os
+import sys
+import threading
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005
+MAX_PROFILED_ROUTES = 200
+# (file, function) of leaf frames that mean the thread is blocked waiting for work
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # concurrent.futures worker blocked in SimpleQueue.get
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES
+
+
+class Sampler:
+    """Samples every thread but its own, or those for which thread_filter(thread_id, frame) is true."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_filter=None):
+        self.interval = interval
+        self.thread_filter = thread_filter
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or _is_idle(frame):
+                    continue
+                if self.thread_filter is not None and not self.thread_filter(thread_id, frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def collapse(samples: Counter, prefix: str | None = None) -> str:
+    lines = []
+    for stack, count in samples.most_common():
+        lines.append(f"{prefix};{stack} {count}" if prefix else f"{stack} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# Held while an on-demand whole-process profile is running
+session_lock = threading.Lock()
+
+# route path -> samples accumulated from requests sent with the X-Profile header
+route_samples: dict[str, Counter] = {}
+_request_lock = threading.Lock()
+# Set to a fresh marker for the profiled request; threadpool jobs run in a copy of its context
+_profiled_request = contextvars.ContextVar("profiled_request", default=None)
+# A threadpool worker's outermost frames hold the copied Context of the job it is running
+_WORKER_FRAMES_SCANNED = 4
+
+
+def _serves_request(frame, marker) -> bool:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    for outer in frames[-_WORKER_FRAMES_SCANNED:]:
+        for value in list(outer.f_locals.values()):
+            if isinstance(value, contextvars.Context) and value.get(_profiled_request) is marker:
+                return True
+    return False
+
+
+class RequestProfilerMiddleware:
+    """ASGI middleware sampling requests that carry `X-Profile: <PROFILE_HEADER_SECRET>`.
+
+    One request is sampled at a time; other flagged requests run unprofiled.
+    Only added by create_app() when PROFILE_HEADER_SECRET is set.
+    """
+
+    def __init__(self, app, secret: str):
+        self.app = app
+        self.secret = secret.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (b"x-profile", self.secret) not in scope["headers"]:
+            return await self.app(scope, receive, send)
+        if not _request_lock.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+        marker = object()
+        token = _profiled_request.set(marker)
+        loop_thread = threading.get_ident()
+        sampler = Sampler(
+            thread_filter=lambda thread_id, frame: thread_id == loop_thread or _serves_request(frame, marker)
+        )
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            samples = sampler.stop()
+            _profiled_request.reset(token)
+            _request_lock.release()
+            route = scope.get("route")
+            key = f"{scope['method']} {route.path if route is not None else scope['path']}"
+            if key in route_samples or len(route_samples) < MAX_PROFILED_ROUTES:
+                route_samples.setdefault(key, Counter()).update(samples)
+
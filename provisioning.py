@@ -0,0 +1,242 @@
+"""Bulk user provisioning from CSV or NDJSON.
+
+Rows are processed in batches: validated with schema.UserCreate, checked for
+duplicate emails/usernames against the file and the database in one query per
+batch, hashed across a process pool and loaded with COPY on Postgres.
+A report line is yielded per row, so callers can stream progress back.
+
+    python provisioning.py users.csv [--format ndjson]
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+
+import database
+import model
+import schema
+from database import SessionLocal
+from routes.utils.security import hash_password
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("PROVISIONING_BATCH_SIZE", "1000"))
+HASH_WORKERS = int(os.getenv("PROVISIONING_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Imports started over HTTP share one small pool so they can't starve the worker serving traffic
+HTTP_HASH_WORKERS = min(HASH_WORKERS, int(os.getenv("PROVISIONING_HTTP_HASH_WORKERS", "2")))
+COPY_COLUMNS = ("username", "email", "first_name", "last_name", "gender", "password_hash", "is_active")
+
+
+def read_rows(lines, fmt: str):
+    """Yield (row_number, dict) from an iterable of text lines."""
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, {key: value for key, value in row.items() if value not in (None, "")}
+    elif fmt == "ndjson":
+        for number, line in enumerate(lines, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, e
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _batches(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _existing(db, emails, usernames) -> tuple:
+    rows = db.execute(
+        select(model.User.email, model.User.username)
+        .where(or_(model.User.email.in_(emails), model.User.username.in_(usernames)))
+    ).all()
+    return {row.email for row in rows}, {row.username for row in rows}
+
+
+def _copy_users(db, users: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for user in users:
+        writer.writerow([
+            user.username, user.email, user.first_name, user.last_name,
+            user.gender.name, user.password_hash, "t",
+        ])
+    buffer.seek(0)
+    raw = db.connection().connection.dbapi_connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(f"COPY users ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _row(user) -> dict:
+    return {column: getattr(user, column) for column in COPY_COLUMNS}
+
+
+def _insert_users(db, users: list):
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_users(db, users)
+    else:
+        db.execute(insert(model.User), [_row(user) for user in users])
+
+
+def _insert_one_by_one(db, new: list, records: list):
+    """Insert rows individually, each under a savepoint, yielding (number, email, error or None)."""
+    for (number, user), record in zip(new, records):
+        try:
+            with db.begin_nested():
+                db.execute(insert(model.User), [_row(record)])
+        except IntegrityError:
+            yield number, user.email, "Email or username already exists"
+        except Exception as e:
+            logger.error(f"Bulk import row {number} failed: {e}")
+            yield number, user.email, "Insert failed"
+        else:
+            yield number, user.email, None
+    db.commit()
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool() -> ProcessPoolExecutor:
+    """Hashing pool for imports run inside the web server, created on first use.
+
+    Workers are spawned rather than forked: forking a process that is running
+    other threads (a uvicorn worker) can copy a held lock into the child and hang it.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ProcessPoolExecutor(
+                max_workers=HTTP_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _shared_pool
+
+
+def shutdown_pool():
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.shutdown(wait=False, cancel_futures=True)
+            _shared_pool = None
+
+
+def provision(lines, fmt: str = "csv", pool: ProcessPoolExecutor | None = None):
+    """Import users, yielding one report dict per input row and a final summary.
+
+    Passwords are hashed in `pool`, or in a private pool of HASH_WORKERS when none is given.
+    """
+    started = time.perf_counter()
+    created = failed = 0
+    seen_emails, seen_usernames = set(), set()
+    db = SessionLocal()
+    try:
+        with nullcontext(pool) if pool is not None else ProcessPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            for batch in _batches(read_rows(lines, fmt), BATCH_SIZE):
+                valid = []
+                for number, data in batch:
+                    if isinstance(data, Exception):
+                        failed += 1
+                        yield {"row": number, "status": "error", "error": f"Invalid JSON: {data}"}
+                        continue
+                    try:
+                        user = schema.UserCreate(**data)
+                    except ValidationError as e:
+                        failed += 1
+                        yield {"row": number, "status": "error", "error": "; ".join(err["msg"] for err in e.errors())}
+                        continue
+                    if user.email in seen_emails or user.username in seen_usernames:
+                        failed += 1
+                        yield {"row": number, "status": "error", "error": "Duplicate email or username in file"}
+                        continue
+                    seen_emails.add(user.email)
+                    seen_usernames.add(user.username)
+                    valid.append((number, user))
+                if not valid:
+                    continue
+
+                taken_emails, taken_usernames = _existing(
+                    db, [user.email for _, user in valid], [user.username for _, user in valid]
+                )
+                new = []
+                for number, user in valid:
+                    if user.email in taken_emails:
+                        failed += 1
+                        yield {"row": number, "status": "error", "error": "Email already exists"}
+                    elif user.username in taken_usernames:
+                        failed += 1
+                        yield {"row": number, "status": "error", "error": "Username already exists"}
+                    else:
+                        new.append((number, user))
+                if not new:
+                    continue
+
+                hashes = pool.map(hash_password, [user.password for _, user in new], chunksize=16)
+                records = [
+                    model.User(
+                        username=user.username, email=user.email, first_name=user.first_name,
+                        last_name=user.last_name, gender=user.gender, password_hash=password_hash, is_active=True,
+                    )
+                    for (_, user), password_hash in zip(new, hashes)
+                ]
+                try:
+                    _insert_users(db, records)
+                    db.commit()
+                except Exception as e:
+                    # Usually a concurrent registration grabbing one of the names after the check;
+                    # retry row by row so only the rows that really conflict are reported
+                    db.rollback()
+                    logger.warning(f"Bulk import batch failed, retrying row by row: {e}")
+                    for number, email, error in _insert_one_by_one(db, new, records):
+                        if error is None:
+                            created += 1
+                            yield {"row": number, "status": "created", "email": email}
+                        else:
+                            failed += 1
+                            yield {"row": number, "status": "error", "error": error}
+                    continue
+                created += len(new)
+                for number, user in new:
+                    yield {"row": number, "status": "created", "email": user.email}
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+    yield {
+        "status": "done",
+        "created": created,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round((created + failed) / elapsed, 1) if elapsed else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    args = parser.parse_args()
+    database.init_engine()
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(args.path, newline="", encoding="utf-8") as f:
+        for line in provision(f, fmt):
+            print(json.dumps(line), flush=True)
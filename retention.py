@@ -0,0 +1,241 @@
+"""Incremental retention job.
+
+Moves messages older than their chat's retention_days into archived_messages
+(or deletes them with RETENTION_MODE=delete) and purges users soft-deleted more
+than RETENTION_USER_GRACE_DAYS ago. Work is done in small batches ordered by
+(timestamp, id), each in its own short transaction, with a pause between batches
+and a back-off while replicas are lagging.
+
+Run once from cron with `python retention.py`, or in-process by setting
+RETENTION_ENABLED=true.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, delete, insert, select, text, tuple_, update
+
+import model
+import database
+import storage
+from database import REPLICA_MAX_LAG_SECONDS, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() in ("1", "true", "yes")
+RETENTION_MODE = os.getenv("RETENTION_MODE", "archive")
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.1"))
+RETENTION_USER_GRACE_DAYS = int(os.getenv("RETENTION_USER_GRACE_DAYS", "30"))
+# Arbitrary constant shared by every worker so only one runs the job at a time
+ADVISORY_LOCK_ID = 0x5E7E1710
+
+ARCHIVE_COLUMNS = (
+    "id", "sender_id", "receiver_id", "chat_id", "content", "message_type", "attachment_url",
+    "parent_message_id", "thread_root_id", "timestamp", "is_read",
+)
+
+
+class RetentionWorker:
+    def __init__(self, interval: float = RETENTION_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stats = {
+            "running": False,
+            "last_started": None,
+            "last_finished": None,
+            "current": None,
+            "messages_archived": 0,
+            "messages_deleted": 0,
+            "users_purged": 0,
+            "rows_per_second": 0.0,
+        }
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _throttle(self):
+        if self._stop.wait(RETENTION_BATCH_PAUSE_SECONDS):
+            return
+        while database.replica_router.engines and not self._stop.is_set():
+            lag = database.replica_router.max_lag()
+            if lag <= REPLICA_MAX_LAG_SECONDS / 2:
+                return
+            logger.info(f"Retention paused, replica lag {lag:.1f}s")
+            self._stop.wait(5)
+
+    def _remove_messages(self, db, ids: list, archive: bool):
+        """Archive/delete one batch of messages in the current transaction."""
+        messages = model.Message.__table__
+        if archive:
+            db.execute(
+                insert(model.ArchivedMessage.__table__).from_select(
+                    ARCHIVE_COLUMNS,
+                    select(*(messages.c[column] for column in ARCHIVE_COLUMNS)).where(messages.c.id.in_(ids)),
+                )
+            )
+        self._reroot_survivors(db, ids)
+        # Newer replies keep their content but lose the link to an archived parent
+        db.execute(update(messages).where(messages.c.parent_message_id.in_(ids)).values(parent_message_id=None))
+        db.execute(update(messages).where(messages.c.thread_root_id.in_(ids)).values(thread_root_id=None))
+        db.execute(delete(messages).where(messages.c.id.in_(ids)))
+
+    def _reroot_survivors(self, db, ids: list):
+        """Make each surviving direct reply of a removed message a thread root and point its
+        replies at it, walking parent_message_id as the thread_root_id backfill migration does."""
+        messages = model.Message.__table__
+        thread = (
+            select(messages.c.id, messages.c.id.label("root_id"))
+            .where(messages.c.parent_message_id.in_(ids), messages.c.id.not_in(ids))
+            .cte("thread", recursive=True)
+        )
+        reply = messages.alias("reply")
+        thread = thread.union_all(
+            select(reply.c.id, thread.c.root_id)
+            .join(thread, reply.c.parent_message_id == thread.c.id)
+            .where(reply.c.id.not_in(ids))
+        )
+        db.execute(
+            update(messages)
+            .where(messages.c.id == thread.c.id)
+            .values(thread_root_id=case((thread.c.id == thread.c.root_id, None), else_=thread.c.root_id))
+        )
+
+    def _drain(self, db, condition, archive: bool) -> int:
+        """Process every message matching condition, oldest first, one batch per transaction."""
+        messages = model.Message.__table__
+        total = 0
+        cursor = None
+        while not self._stop.is_set():
+            query = select(messages.c.id, messages.c.timestamp).where(condition)
+            if cursor is not None:
+                query = query.where(tuple_(messages.c.timestamp, messages.c.id) > tuple_(*cursor))
+            if db.get_bind().dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True)
+            rows = db.execute(query.order_by(messages.c.timestamp, messages.c.id).limit(RETENTION_BATCH_SIZE)).all()
+            if not rows:
+                db.rollback()
+                break
+            started = time.perf_counter()
+            self._remove_messages(db, [row.id for row in rows], archive)
+            db.commit()
+            cursor = (rows[-1].timestamp, rows[-1].id)
+            total += len(rows)
+            self.stats["messages_archived" if archive else "messages_deleted"] += len(rows)
+            self.stats["rows_per_second"] = round(len(rows) / max(time.perf_counter() - started, 1e-6), 1)
+            self._throttle()
+        return total
+
+    def expire_messages(self, db):
+        now = datetime.utcnow()
+        chats = db.execute(
+            select(model.Chat.id, model.Chat.retention_days).where(model.Chat.retention_days.is_not(None))
+        ).all()
+        db.rollback()
+        for chat in chats:
+            if self._stop.is_set():
+                return
+            self.stats["current"] = f"chat {chat.id}"
+            cutoff = now - timedelta(days=chat.retention_days)
+            messages = model.Message.__table__
+            count = self._drain(
+                db,
+                (messages.c.chat_id == chat.id) & (messages.c.timestamp < cutoff),
+                archive=RETENTION_MODE == "archive",
+            )
+            if count:
+                logger.info(f"Retention: {count} messages from chat {chat.id} older than {chat.retention_days} days")
+
+    def purge_deleted_users(self, db):
+        cutoff = datetime.utcnow() - timedelta(days=RETENTION_USER_GRACE_DAYS)
+        user_ids = db.execute(
+            select(model.User.id).where(model.User.deleted_at.is_not(None), model.User.deleted_at < cutoff)
+        ).scalars().all()
+        db.rollback()
+        messages = model.Message.__table__
+        for user_id in user_ids:
+            if self._stop.is_set():
+                return
+            self.stats["current"] = f"user {user_id}"
+            self._drain(db, messages.c.sender_id == user_id, archive=False)
+            if self._stop.is_set():
+                return
+            db.execute(update(messages).where(messages.c.receiver_id == user_id).values(receiver_id=None))
+            db.execute(delete(model.ArchivedMessage).where(model.ArchivedMessage.sender_id == user_id))
+            db.execute(delete(model.chat_participants).where(model.chat_participants.c.user_id == user_id))
+            uploads = db.execute(
+                delete(model.Attachment).where(model.Attachment.uploader_id == user_id).returning(model.Attachment.sha256)
+            ).scalars().all()
+            db.execute(delete(model.TokenRevocation).where(model.TokenRevocation.user_id == user_id))
+            db.execute(delete(model.User).where(model.User.id == user_id))
+            db.commit()
+            self._remove_unreferenced_objects(db, set(uploads))
+            self.stats["users_purged"] += 1
+            logger.info(f"Retention: purged soft-deleted user {user_id}")
+            self._throttle()
+
+    def _remove_unreferenced_objects(self, db, sha256s: set):
+        """Delete stored files (and thumbnails) no remaining attachment row points at."""
+        if not sha256s:
+            return
+        referenced = set(db.execute(
+            select(model.Attachment.sha256).where(model.Attachment.sha256.in_(sha256s)).distinct()
+        ).scalars())
+        db.rollback()
+        for sha256 in sha256s - referenced:
+            storage.store.delete(sha256)
+
+    def run_once(self):
+        # Session-level advisory lock, held on its own connection for the whole run
+        lock_conn = database.engine.connect() if database.engine.dialect.name == "postgresql" else None
+        if lock_conn is not None:
+            locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar()
+            lock_conn.commit()
+            if not locked:
+                lock_conn.close()
+                logger.info("Retention already running elsewhere, skipping")
+                return
+        db = SessionLocal()
+        try:
+            self.stats.update(running=True, last_started=datetime.utcnow().isoformat())
+            self.expire_messages(db)
+            self.purge_deleted_users(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Retention run failed: {e}")
+        finally:
+            db.close()
+            if lock_conn is not None:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+                lock_conn.commit()
+                lock_conn.close()
+            self.stats.update(running=False, current=None, last_finished=datetime.utcnow().isoformat())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if not RETENTION_ENABLED:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+worker = RetentionWorker()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    database.init_engine()
+    worker.run_once()
+    print(worker.stats)
@@ -0,0 +1,152 @@
+"""Per-worker token revocation store.
+
+Revoked token ids and per-user token generations are kept in memory and
+refreshed incrementally from the token_revocations table, so checking a token
+that was never revoked is a couple of dict lookups and never touches the database.
+"""
+import calendar
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+import model
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+# Generation bumps only need to be remembered as long as a token issued before them can live
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+# Ids are allocated before commit, so a row can become visible after a higher id already has.
+# Each sync re-reads this many rows behind the cursor to pick such stragglers up.
+SYNC_OVERLAP_ROWS = 100
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class RevocationStore:
+    def __init__(self, interval: float = REVOCATION_SYNC_SECONDS):
+        self.interval = interval
+        # jti -> unix expiry of the revoked token
+        self._jtis: dict[str, float] = {}
+        # user_id -> (minimum valid generation, unix time the entry can be forgotten)
+        self._generations: dict[int, tuple] = {}
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_revoked(self, payload: dict) -> bool:
+        jti = payload.get("jti")
+        if jti is not None and jti in self._jtis:
+            return True
+        user_id = payload.get("uid")
+        if user_id is not None and user_id in self._generations:
+            return payload.get("gen", 0) < self._generations[user_id][0]
+        return False
+
+    def _add_jti(self, jti: str, expires_at: float):
+        self._jtis[jti] = expires_at
+
+    def _add_generation(self, user_id: int, generation: int, expires_at: float):
+        current = self._generations.get(user_id)
+        if current is None or generation > current[0]:
+            self._generations[user_id] = (generation, expires_at)
+
+    def revoke_token(self, db, payload: dict):
+        """Revoke a single decoded token."""
+        jti, user_id = payload.get("jti"), payload.get("uid")
+        if jti is None or user_id is None:
+            return
+        expires_at = datetime.utcfromtimestamp(payload["exp"])
+        db.add(model.TokenRevocation(jti=jti, user_id=user_id, expires_at=expires_at))
+        db.commit()
+        with self._lock:
+            self._add_jti(jti, float(payload["exp"]))
+
+    def revoke_all(self, db, user_id: int) -> int:
+        """Invalidate every token issued to the user so far. Returns the new generation."""
+        generation = db.execute(
+            update(model.User)
+            .where(model.User.id == user_id)
+            .values(token_generation=model.User.token_generation + 1)
+            .returning(model.User.token_generation)
+        ).scalar_one()
+        expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        db.add(model.TokenRevocation(user_id=user_id, generation=generation, expires_at=expires_at))
+        db.commit()
+        with self._lock:
+            self._add_generation(user_id, generation, calendar.timegm(expires_at.utctimetuple()))
+        return generation
+
+    def sync(self):
+        """Pull revocations added since the last sync, and drop expired entries."""
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(
+                    model.TokenRevocation.id,
+                    model.TokenRevocation.jti,
+                    model.TokenRevocation.user_id,
+                    model.TokenRevocation.generation,
+                    model.TokenRevocation.expires_at,
+                )
+                .where(model.TokenRevocation.id > self._cursor - SYNC_OVERLAP_ROWS)
+                .order_by(model.TokenRevocation.id)
+            ).all()
+            now = time.time()
+            with self._lock:
+                for row in rows:
+                    expires_at = calendar.timegm(row.expires_at.utctimetuple())
+                    if expires_at <= now:
+                        continue
+                    if row.jti is not None:
+                        self._add_jti(row.jti, expires_at)
+                    if row.generation is not None:
+                        self._add_generation(row.user_id, row.generation, expires_at)
+                if rows:
+                    self._cursor = rows[-1].id
+                self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+                self._generations = {uid: entry for uid, entry in self._generations.items() if entry[1] > now}
+        except Exception as e:
+            logger.error(f"Failed to sync token revocations: {e}")
+        finally:
+            db.close()
+
+    def purge_expired(self):
+        db = SessionLocal()
+        try:
+            db.execute(delete(model.TokenRevocation).where(model.TokenRevocation.expires_at < datetime.utcnow()))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to purge expired token revocations: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        purged_at = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self.sync()
+            if time.monotonic() - purged_at > PURGE_INTERVAL_SECONDS:
+                self.purge_expired()
+                purged_at = time.monotonic()
+
+    def start(self):
+        self.sync()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+store = RevocationStore()
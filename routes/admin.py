@@ -0,0 +1,44 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from . auth import get_current_admin
+import profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(get_current_admin)])
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=120),
+    interval_ms: float = Query(5, ge=1, le=1000),
+):
+    """Sample this worker for `seconds` and return a collapsed-stack profile.
+
+    Only the worker that receives this request is profiled. Pipe the output
+    into flamegraph.pl or load it in speedscope.
+    """
+    if not profiler.session_lock.acquire(blocking=False):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running on this worker")
+    try:
+        sampler = profiler.Sampler(interval_ms / 1000)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            samples = sampler.stop()
+    finally:
+        profiler.session_lock.release()
+    return profiler.collapse(samples)
+
+
+@router.get("/profile/routes", response_class=PlainTextResponse)
+async def get_route_profiles():
+    """Stacks sampled from requests sent with the X-Profile header, rooted at their route."""
+    return "".join(profiler.collapse(samples, prefix=route) for route, samples in profiler.route_samples.items())
+
+
+@router.delete("/profile/routes", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_route_profiles():
+    profiler.route_samples.clear()
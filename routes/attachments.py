@@ -0,0 +1,199 @@
+import os
+import re
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+
+from database import get_db, get_read_db
+from . auth import get_current_user
+from .utils.limiter import limiter
+import model
+import schema
+import storage
+
+router = APIRouter(prefix="/attachments", tags=["attachments"])
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+UPLOAD_RATE_LIMIT = os.getenv("UPLOAD_RATE_LIMIT", "30/minute")
+# Served inline from the API origin; anything else is a download, so uploaded HTML/SVG can't run script
+INLINE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+SAFE_HEADERS = {"X-Content-Type-Options": "nosniff"}
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse that honours a single `Range: bytes=...` request.
+
+    Uses the ASGI zero-copy extensions (pathsend / zerocopysend) when the
+    server offers them, and falls back to chunked reads otherwise.
+    """
+
+    def __init__(self, path: str, range_header: str | None = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.range_header = range_header
+        self.headers["accept-ranges"] = "bytes"
+
+    def _parse_range(self, size: int):
+        match = RANGE_RE.match(self.range_header.strip())
+        if not match or match.groups() == ("", ""):
+            return None  # multiple or malformed ranges: serve the whole file
+        start, end = match.groups()
+        if start == "":
+            length = min(int(end), size)
+            return size - length, size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        return start, end
+
+    async def __call__(self, scope, receive, send):
+        if not self.range_header:
+            return await super().__call__(scope, receive, send)
+        stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+        self.set_stat_headers(stat_result)
+        size = stat_result.st_size
+        byte_range = self._parse_range(size)
+        if byte_range is None:
+            return await super().__call__(scope, receive, send)
+        start, end = byte_range
+        if start >= size or start > end:
+            response = Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+            return await response(scope, receive, send)
+
+        count = end - start + 1
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(count)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        extensions = scope.get("extensions") or {}
+        with open(self.path, "rb") as file:
+            if "http.response.zerocopysend" in extensions:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": start,
+                    "count": count,
+                    "more_body": False,
+                })
+                return
+            offset = start
+            while count > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, file.fileno(), min(self.chunk_size, count), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+
+
+def _to_response(attachment: model.Attachment) -> dict:
+    thumbnail = storage.store.thumbnail_path(attachment.sha256)
+    return {
+        "id": attachment.id,
+        "url": f"/attachments/{attachment.id}",
+        "thumbnail_url": f"/attachments/{attachment.id}/thumbnail" if attachment.content_type.startswith("image/") else None,
+        "sha256": attachment.sha256,
+        "size": attachment.size,
+        "content_type": attachment.content_type,
+        "filename": attachment.filename,
+        "created_at": attachment.created_at,
+        "thumbnail_ready": os.path.exists(thumbnail),
+    }
+
+
+def attachment_visible(db: Session, attachment: model.Attachment, user_id: int) -> bool:
+    """Attachments are visible to their uploader and to members of any chat they were posted in."""
+    if attachment.uploader_id == user_id:
+        return True
+    shared = (
+        db.query(model.Message.id)
+        .join(model.chat_participants, model.chat_participants.c.chat_id == model.Message.chat_id)
+        .filter(
+            model.Message.attachment_url == f"/attachments/{attachment.id}",
+            model.chat_participants.c.user_id == user_id,
+        )
+        .first()
+    )
+    return shared is not None
+
+
+def _get_visible_attachment(db: Session, attachment_id: int, user: model.User) -> model.Attachment:
+    attachment = db.get(model.Attachment, attachment_id)
+    if attachment is None or not attachment_visible(db, attachment, user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
+    return attachment
+
+
+@router.post("/", response_model=schema.AttachmentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_attachment(
+    request: Request,
+    filename: str | None = None,
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Stream the raw request body into the object store.
+
+    Send the file as the request body (chunked transfer encoding is fine) with
+    its Content-Type; the body is hashed and written as it arrives.
+    """
+    limiter.enforce(f"uploads:user:{current_user.id}", UPLOAD_RATE_LIMIT)
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    # Checked before streaming so an over-long value can't leave an orphaned object behind
+    if len(content_type) > 255:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Content-Type too long")
+    if filename is not None and len(filename) > 255:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Filename too long")
+    try:
+        sha256, size = await storage.store.save_stream(request.stream())
+    except storage.ObjectTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    if size == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty upload")
+    attachment = model.Attachment(
+        uploader_id=current_user.id,
+        sha256=sha256,
+        size=size,
+        content_type=content_type,
+        filename=filename,
+    )
+    db.add(attachment)
+    db.commit()
+    db.refresh(attachment)
+    if content_type.startswith("image/"):
+        storage.store.schedule_thumbnail(sha256)
+    return _to_response(attachment)
+
+
+@router.get("/{attachment_id}")
+async def download_attachment(
+    attachment_id: int,
+    request: Request,
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    attachment = _get_visible_attachment(db, attachment_id, current_user)
+    media_type = attachment.content_type.split(";")[0].strip().lower()
+    inline = media_type in INLINE_CONTENT_TYPES
+    return RangeFileResponse(
+        storage.store.object_path(attachment.sha256),
+        range_header=request.headers.get("range"),
+        media_type=media_type if inline else "application/octet-stream",
+        filename=attachment.filename or f"attachment-{attachment.id}",
+        content_disposition_type="inline" if inline else "attachment",
+        headers=SAFE_HEADERS,
+    )
+
+
+@router.get("/{attachment_id}/thumbnail")
+async def download_thumbnail(
+    attachment_id: int,
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    attachment = _get_visible_attachment(db, attachment_id, current_user)
+    path = storage.store.thumbnail_path(attachment.sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not available yet")
+    return FileResponse(path, media_type="image/jpeg", headers=SAFE_HEADERS)
@@ -1,28 +1,26 @@
-from datetime import datetime, timedelta
-from fastapi import Depends, HTTPException, status, APIRouter, Request
+from datetime import timedelta
+from fastapi import Depends, HTTPException, status, APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 import logging
 from .utils.security import (
     hash_password, verify_password,
     create_access_token, create_refresh_token,
     SECRET_KEY, ALGORITHM
 )
+from .utils.limiter import limit_by_ip
 
 import model
-from database import get_db
+import activity
+import revocation
+from database import get_db, get_read_db
 import schema
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure rate limiting
-limiter = Limiter(key_func=get_remote_address)
-
 router = APIRouter(
     prefix='/auth',
     tags=['auth']
@@ -35,7 +33,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/auth/token')
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Retrieve the current authenticated user from a JWT token."""
     credentials_exception = HTTPException(
@@ -47,7 +45,7 @@ async def get_current_user(
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         scopes: list = payload.get("scopes", [])
-        if email is None:
+        if email is None or revocation.store.is_revoked(payload):
             raise credentials_exception
         token_data = schema.TokenData(email=email, scopes=scopes)
     except JWTError:
@@ -59,16 +57,24 @@ async def get_current_user(
 
 
 
+async def get_current_admin(current_user: model.User = Depends(get_current_user)):
+    """Require the authenticated user to be an administrator."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+
+
 @router.post(
     '/token',
     response_model=schema.Token,
     summary="User login",
-    description="Authenticate a user and return an access token and refresh token."
+    description="Authenticate a user and return an access token and refresh token.",
+    dependencies=[Depends(limit_by_ip("login", "10/minute"))]
 )
-@limiter.limit("10/minute")
 async def login(
-    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
+    # Primary, not a replica: a lagging token_generation would mint tokens revoke-all already invalidated
     db: Session = Depends(get_db),
     
 ):
@@ -82,18 +88,17 @@ async def login(
             detail="Incorrect email, password, or account is deactivated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user.last_login = datetime.utcnow()
-    db.commit()
-    db.refresh(user)  # optional: reload the updated user
+    activity.recorder.record_login(user.id)
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(days=7)
+    claims = {"sub": user.email, "uid": user.id, "gen": user.token_generation}
     access_token = create_access_token(
-        data={"sub": user.email},
+        data=claims,
         expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(
-        data={"sub": user.email},
+        data=claims,
         expires_delta=refresh_token_expires
     )
     logger.info(f"Successful login for email: {user.email}")
@@ -108,16 +113,17 @@ async def login(
     '/refresh',
     response_model=schema.Token,
     summary="Refresh access token",
-    description="Generate a new access token using a valid refresh token."
+    description="Generate a new access token using a valid refresh token.",
+    dependencies=[Depends(limit_by_ip("refresh", "10/minute"))]
 )
-@limiter.limit("10/minute")
 async def refresh_token(
-    request: Request,
     refresh_token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-    
 ):
-    """Refresh an access token using a refresh token."""
+    """Refresh an access token using a refresh token.
+
+    Everything needed is in the token's claims; revocation (including account
+    deactivation via revoke-all) is checked against the in-memory store.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate refresh token",
@@ -128,17 +134,15 @@ async def refresh_token(
         if payload.get("type") != "refresh":
             raise credentials_exception
         email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        user = db.query(model.User).filter(model.User.email == email).first()
-        if user is None or not user.is_active:
+        # Tokens issued before uid/gen claims existed can't be revoked; make them log in again
+        if email is None or payload.get("uid") is None or revocation.store.is_revoked(payload):
             raise credentials_exception
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.email, "scopes": [user.role.value]},
+            data={"sub": email, "uid": payload["uid"], "gen": payload.get("gen", 0)},
             expires_delta=access_token_expires
         )
-        logger.info(f"Access token refreshed for email: {user.email}")
+        logger.info(f"Access token refreshed for email: {email}")
         return {
             "access_token": access_token,
             "token_type": "bearer",
@@ -147,4 +151,44 @@ async def refresh_token(
         }
     except JWTError:
         logger.warning(f"Failed refresh token attempt")
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+
+@router.post(
+    '/logout',
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Revoke tokens",
+    description="Revoke the current access token and, if given, its refresh token."
+)
+async def logout(
+    body: schema.TokenRevoke | None = None,
+    token: str = Depends(oauth2_scheme),
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Revoke the presented access token and an optional refresh token."""
+    revocation.store.revoke_token(db, jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
+    if body is not None and body.refresh_token:
+        try:
+            payload = jwt.decode(body.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid refresh token")
+        if payload.get("uid") != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot revoke another user's token")
+        revocation.store.revoke_token(db, payload)
+    logger.info(f"Tokens revoked for email: {current_user.email}")
+
+
+@router.post(
+    '/revoke-all',
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Revoke all tokens",
+    description="Invalidate every access and refresh token issued to the current user."
+)
+async def revoke_all_tokens(
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Bump the user's token generation so all previously issued tokens fail."""
+    revocation.store.revoke_all(db, current_user.id)
+    logger.info(f"All tokens revoked for email: {current_user.email}")
@@ -2,7 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from . auth import get_current_user
-from database import get_db
+from database import get_db, get_read_db
 import schema
 import model
 from datetime import datetime
@@ -35,7 +35,7 @@ async def create_chat(chat: schema.ChatCreate, current_user: model.User = Depend
     return db_chat
 
 @router.get("/", response_model=list[schema.ChatResponse])
-async def get_chats(current_user: model.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_chats(current_user: model.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     chats = (
         db.query(model.Chat)
         .join(model.chat_participants)
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+import os
+import re
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session, joinedload
+from database import get_db, get_read_db
 from . auth import get_current_user
+from .attachments import attachment_visible
+from .utils.limiter import limiter
 import schema
 import model
 from datetime import datetime
@@ -11,6 +17,58 @@ from datetime import datetime
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+MESSAGE_RATE_LIMIT = os.getenv("MESSAGE_RATE_LIMIT", "60/minute")
+ATTACHMENT_PATH_RE = re.compile(r"^/attachments/(\d+)$")
+
+
+def resolve_thread_root(db: Session, chat_id: int, parent_message_id: Optional[int]) -> Optional[int]:
+    """Return the thread root for a reply to parent_message_id.
+
+    Raises LookupError if the parent does not exist in the same chat.
+    """
+    if parent_message_id is None:
+        return None
+    parent = (
+        db.query(model.Message.id, model.Message.thread_root_id)
+        .filter(model.Message.id == parent_message_id, model.Message.chat_id == chat_id)
+        .first()
+    )
+    if parent is None:
+        raise LookupError(parent_message_id)
+    return parent.thread_root_id or parent.id
+
+
+def check_attachment_url(db: Session, attachment_url: Optional[str], user_id: int):
+    """Raise LookupError if attachment_url names an uploaded attachment user_id cannot see.
+
+    Posting an attachment makes it visible to the chat, so only attachments the
+    sender could already read may be referenced. External URLs are not checked.
+    """
+    match = ATTACHMENT_PATH_RE.match(attachment_url or "")
+    if match is None:
+        return
+    attachment = db.get(model.Attachment, int(match.group(1)))
+    if attachment is None or not attachment_visible(db, attachment, user_id):
+        raise LookupError(attachment_url)
+
+
+def _ensure_participant(db: Session, chat_id: int, user_id: int):
+    is_member = (
+        db.query(model.chat_participants.c.chat_id)
+        .filter(model.chat_participants.c.chat_id == chat_id, model.chat_participants.c.user_id == user_id)
+        .first()
+    )
+    if is_member is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+
+
+def _get_visible_message(db: Session, message_id: int, user_id: int) -> model.Message:
+    message = db.get(model.Message, message_id)
+    if message is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+    _ensure_participant(db, message.chat_id, user_id)
+    return message
+
 
 @router.post("/", response_model=schema.MessageResponse, status_code=status.HTTP_201_CREATED)
 async def create_message(
@@ -20,9 +78,18 @@ async def create_message(
 ):
     if message.sender_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot send message as another user")
+    limiter.enforce(f"messages:user:{current_user.id}", MESSAGE_RATE_LIMIT)
     receiver = db.query(model.User).filter(model.User.id == message.receiver_id).first()
     if not receiver:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Receiver not found")
+    try:
+        thread_root_id = resolve_thread_root(db, message.chat_id, message.parent_message_id)
+    except LookupError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent message not found")
+    try:
+        check_attachment_url(db, message.attachment_url, current_user.id)
+    except LookupError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
     db_message = model.Message(
         sender_id=message.sender_id,
         receiver_id=message.receiver_id,
@@ -31,6 +98,7 @@ async def create_message(
         message_type=message.message_type,
         attachment_url=message.attachment_url,
         parent_message_id=message.parent_message_id,
+        thread_root_id=thread_root_id,
         timestamp=datetime.utcnow(),
         is_read=message.is_read
     )
@@ -43,6 +111,90 @@ async def create_message(
 
 
 @router.get("/chats/{chat_id}/messages", response_model=list[schema.MessageResponse])
-async def get_chats(current_user: model.User = Depends(get_current_user), db: Session = Depends(get_db)):
-  chats = db.query(model.Message).filter(model.Message.parent_message.has(id=current_user.id)).all()
-  return chats
+async def get_chats(
+    chat_id: int,
+    before_id: Optional[int] = Query(None, description="Return messages older than this message ID"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Chat history, newest first, paged by message ID."""
+    _ensure_participant(db, chat_id, current_user.id)
+    query = db.query(model.Message).options(joinedload(model.Message.sender)).filter(model.Message.chat_id == chat_id)
+    if before_id is not None:
+        query = query.filter(model.Message.id < before_id)
+    return query.order_by(model.Message.id.desc()).limit(limit).all()
+
+
+@router.get("/reply-counts", response_model=list[schema.ReplyCount])
+async def get_reply_counts(
+    message_ids: list[int] = Query(..., max_length=200, description="Message IDs from the page being displayed"),
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Direct reply and whole-thread counts for a page of messages, in two indexed GROUP BYs.
+
+    thread_size is only known for thread roots; it is null for messages that are themselves replies.
+    """
+    visible = dict(
+        db.query(model.Message.id, model.Message.thread_root_id)
+        .join(model.chat_participants, model.chat_participants.c.chat_id == model.Message.chat_id)
+        .filter(model.Message.id.in_(message_ids), model.chat_participants.c.user_id == current_user.id)
+        .all()
+    )
+    replies = dict(
+        db.query(model.Message.parent_message_id, func.count())
+        .filter(model.Message.parent_message_id.in_(visible))
+        .group_by(model.Message.parent_message_id)
+        .all()
+    )
+    roots = [message_id for message_id, thread_root_id in visible.items() if thread_root_id is None]
+    threads = dict(
+        db.query(model.Message.thread_root_id, func.count())
+        .filter(model.Message.thread_root_id.in_(roots))
+        .group_by(model.Message.thread_root_id)
+        .all()
+    )
+    return [
+        {
+            "message_id": message_id,
+            "reply_count": replies.get(message_id, 0),
+            "thread_size": threads.get(message_id, 0) if thread_root_id is None else None,
+        }
+        for message_id, thread_root_id in visible.items()
+    ]
+
+
+@router.get("/{message_id}/thread", response_model=list[schema.MessageResponse])
+async def get_thread(
+    message_id: int,
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Every message in the thread containing message_id, oldest first, in one query."""
+    message = _get_visible_message(db, message_id, current_user.id)
+    root_id = message.thread_root_id or message.id
+    return (
+        db.query(model.Message)
+        .options(joinedload(model.Message.sender))
+        .filter(or_(model.Message.id == root_id, model.Message.thread_root_id == root_id))
+        .order_by(model.Message.id)
+        .all()
+    )
+
+
+@router.get("/{message_id}/replies", response_model=list[schema.MessageResponse])
+async def get_replies(
+    message_id: int,
+    current_user: model.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Direct replies to a message, oldest first."""
+    _get_visible_message(db, message_id, current_user.id)
+    return (
+        db.query(model.Message)
+        .options(joinedload(model.Message.sender))
+        .filter(model.Message.parent_message_id == message_id)
+        .order_by(model.Message.id)
+        .all()
+    )
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+import database
+import retention
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/pool")
+async def get_pool_stats():
+    """Connection pool usage for this worker, primary and replicas."""
+    return {
+        "primary": database.pool_stats(database.engine),
+        "replicas": [database.pool_stats(replica) for replica in database.replica_router.engines],
+    }
+
+
+@router.get("/retention")
+async def get_retention_stats():
+    """Progress of the retention worker running in this process."""
+    return retention.worker.stats
@@ -1,20 +1,22 @@
-from fastapi import Depends, APIRouter,HTTPException, Request, status, FastAPI
+import io
+import json
+import tempfile
+from fastapi import Depends, APIRouter,HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, case, func, literal
 from sqlalchemy.orm import Session
 import model
-from database import get_db
+from cache import TTLCache
+from database import get_db, get_read_db
 import schema
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 from sqlalchemy.exc import IntegrityError
 import logging
 from . import auth
+from .utils.limiter import limit_by_ip
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-limiter = Limiter(key_func=get_remote_address)
-app = FastAPI()
-app.state.limiter = limiter
 
 
 
@@ -24,11 +26,15 @@ router = APIRouter(
     tags=['users']
 )
 
-@router.post('/register', status_code=status.HTTP_201_CREATED,response_model=schema.UserResponse)
-@limiter.limit('5/minute')
+# Hot autocomplete prefixes ("a", "al", "ale"...) are shared by many users typing at once
+search_cache = TTLCache(maxsize=2048, ttl=30)
+# Shorter terms produce too few trigrams for the fuzzy index to be selective
+FUZZY_MIN_LENGTH = 3
+
+@router.post('/register', status_code=status.HTTP_201_CREATED,response_model=schema.UserResponse,
+             dependencies=[Depends(limit_by_ip("register", "5/minute"))])
 def create_user(
     user:schema.UserCreate,
-    request: Request,
     db: Session = Depends(get_db),
     
    ):
@@ -78,4 +84,71 @@ def create_user(
 @router.get("/me", response_model=schema.UserResponse)
 async def get_current_user_data(current_user: model.User = Depends(auth.get_current_user)):
     return current_user
-        
\ No newline at end of file
+
+
+@router.get("/search", response_model=list[schema.UserSearchResult])
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=50, description="Start of a username, first or last name"),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: model.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Prefix and fuzzy directory search over username, first and last name."""
+    term = q.strip().lower()
+    if not term:
+        return []
+    cached = search_cache.get((term, limit))
+    if cached is not None:
+        return cached
+
+    pattern = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    username_prefix = func.lower(model.User.username).like(pattern, escape="\\")
+    query = db.query(
+        model.User.id, model.User.username, model.User.first_name, model.User.last_name
+    ).filter(model.User.deleted_at.is_(None), model.User.is_active.is_(True))
+    if len(term) < FUZZY_MIN_LENGTH:
+        query = query.filter(username_prefix).order_by(model.User.username)
+    else:
+        # Word-start match on first/last name, served by the trigram index like the fuzzy match
+        name_prefix = model.user_search_text.like("% " + pattern, escape="\\")
+        order = [case((username_prefix, 0), else_=1)]
+        if db.get_bind().dialect.name == "postgresql":
+            # Word similarity: compares the term with the closest word run in the text, so a typo in
+            # one name still matches; plain % would compare it with the whole "username first last".
+            term_literal = literal(term, String)
+            query = query.filter(username_prefix | name_prefix | term_literal.op("<%")(model.user_search_text))
+            order.append(func.word_similarity(term_literal, model.user_search_text).desc())
+        else:
+            query = query.filter(username_prefix | name_prefix)
+        query = query.order_by(*order, model.User.username)
+
+    results = [row._asdict() for row in query.limit(limit).all()]
+    search_cache.set((term, limit), results)
+    return results
+
+
+@router.post("/bulk-import", summary="Bulk import users", response_class=StreamingResponse)
+async def bulk_import_users(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    admin: model.User = Depends(auth.get_current_admin),
+):
+    """Import users from a CSV or NDJSON request body.
+
+    The response is NDJSON: one line per input row ("created" or "error" with the
+    reason) followed by a summary line, streamed as each batch is committed.
+    """
+    import provisioning  # pulls in multiprocessing; only admins ever hit this route
+
+    logger.info(f"Bulk import started by {admin.email}")
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+
+    def report():
+        with io.TextIOWrapper(spool, encoding="utf-8", newline="") as lines:
+            for line in provisioning.provision(lines, format, pool=provisioning.shared_pool()):
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(report(), media_type="application/x-ndjson")
@@ -0,0 +1,106 @@
+"""Token-bucket rate limiter shared by every worker process on the host.
+
+Buckets live in a memory-mapped file (under /dev/shm when available), so a
+limit of "10/minute" means 10 per minute for the whole host rather than per
+worker. Each key hashes to one fixed 24-byte slot; a check locks only that
+slot's byte range with fcntl, updates it in place and unlocks, which costs a
+few microseconds and never touches the database. Keys that collide on a slot
+evict each other and start with a full bucket, so an undersized table errs on
+the side of allowing requests.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+from fastapi import HTTPException, Request, status
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: buckets are then only shared between threads
+    fcntl = None
+
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+RATE_LIMIT_PATH = os.getenv(
+    "RATE_LIMIT_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "danger-ratelimit"),
+)
+
+# key hash, tokens left, time of last refill (CLOCK_MONOTONIC is system-wide on Linux)
+SLOT = struct.Struct("<Qdd")
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_limit(limit: str) -> tuple:
+    """Parse "10/minute" into (refill rate per second, bucket capacity)."""
+    count, period = limit.split("/")
+    count = float(count)
+    return count / PERIODS[period.strip().rstrip("s")], count
+
+
+class SharedTokenBucket:
+    def __init__(self, path: str = RATE_LIMIT_PATH, slots: int = RATE_LIMIT_SLOTS):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        size = self.slots * SLOT.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+
+    def hit(self, key: str, limit: str, cost: float = 1.0) -> float:
+        """Take `cost` tokens for key. Returns 0 if allowed, else seconds until it would be."""
+        rate, capacity = parse_limit(limit)
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        offset = (key_hash % self.slots) * SLOT.size
+        with self._lock:
+            if self._map is None:
+                self._open()
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, SLOT.size, offset)
+            try:
+                stored_hash, tokens, updated = SLOT.unpack_from(self._map, offset)
+                now = time.monotonic()
+                if stored_hash != key_hash:
+                    tokens, updated = capacity, now
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                SLOT.pack_into(self._map, offset, key_hash, tokens, now)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, SLOT.size, offset)
+        return 0.0 if allowed else (cost - tokens) / rate
+
+    def enforce(self, key: str, limit: str):
+        """Raise 429 with Retry-After when key is over its limit."""
+        retry_after = self.hit(key, limit)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {limit}",
+                headers={"Retry-After": str(max(1, round(retry_after)))},
+            )
+
+
+limiter = SharedTokenBucket()
+
+
+def limit_by_ip(scope: str, limit: str):
+    """Route dependency applying `limit` per client address."""
+    def dependency(request: Request):
+        host = request.client.host if request.client else "unknown"
+        limiter.enforce(f"{scope}:ip:{host}", limit)
+    return dependency
@@ -73,6 +73,15 @@ class UserResponse(UserBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+
+class UserSearchResult(BaseModel):
+    id: int
+    username: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
     
 class UserLogin(BaseModel):
     email: EmailStr
@@ -89,6 +98,9 @@ class Token(BaseModel):
     expires_in: Optional[int] = None  # Seconds until expiration
     refresh_token: Optional[str] = None  # For refresh token support
 
+class TokenRevoke(BaseModel):
+    refresh_token: Optional[str] = None
+
 class TokenData(BaseModel):
     email: EmailStr | None=None
     user_id: Optional[int] = None
@@ -115,7 +127,7 @@ class MessageCreate(BaseModel):
 
     @field_validator("attachment_url")
     def validate_attachment_url(cls, value: Optional[str]) -> Optional[str]:
-        if value and not re.match(r"^https?://[^\s/$.?#].[^\s]*$", value):
+        if value and not re.match(r"^(https?://[^\s/$.?#].[^\s]*|/attachments/\d+)$", value):
             raise ValueError("Invalid URL format for attachment")
         return value
 
@@ -129,16 +141,36 @@ class MessageCreate(BaseModel):
 class MessageResponse(BaseModel):
     id: int = Field(..., description="Unique message ID")
     sender: UserResponse = Field(..., description="Sender user details")
-    receiver_id: int = Field(..., description="ID of the user who received the message")
+    receiver_id: Optional[int] = Field(None, description="ID of the user who received the message")
     content: str = Field(..., description="Message content")
     message_type: MessageType = Field(..., description="Type of message")
     attachment_url: Optional[str] = Field(None, description="URL of an attached file or image")
     parent_message_id: Optional[int] = Field(None, description="ID of the parent message for replies")
+    thread_root_id: Optional[int] = Field(None, description="ID of the first message of the reply thread")
     timestamp: datetime = Field(..., description="Timestamp of message creation")
     is_read: bool = Field(..., description="Whether the message has been read")
 
     model_config = ConfigDict(from_attributes=True)
 
+class ReplyCount(BaseModel):
+    message_id: int = Field(..., description="Message ID")
+    reply_count: int = Field(..., description="Number of direct replies")
+    thread_size: Optional[int] = Field(
+        None, description="Number of replies anywhere in the thread, for thread roots only; null for replies"
+    )
+
+# --------- Attachment Schemas ---------
+class AttachmentResponse(BaseModel):
+    id: int = Field(..., description="Unique attachment ID")
+    url: str = Field(..., description="Path to download the attachment; use as a message's attachment_url")
+    thumbnail_url: Optional[str] = Field(None, description="Path to the thumbnail, for images")
+    thumbnail_ready: bool = Field(False, description="Whether the thumbnail has been generated yet")
+    sha256: str = Field(..., description="SHA-256 of the content")
+    size: int = Field(..., description="Size in bytes")
+    content_type: str = Field(..., description="MIME type given at upload")
+    filename: Optional[str] = Field(None, description="Original file name")
+    created_at: datetime = Field(..., description="Timestamp of upload")
+
 # --------- Chat Schemas ---------
 class ChatCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100, description="Name of the chat or group")
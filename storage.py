@@ -0,0 +1,115 @@
+"""Content-addressed local filesystem object store for message attachments.
+
+Objects live at <ATTACHMENT_STORAGE_DIR>/objects/ab/cd/<sha256>, so identical
+uploads share one file. Thumbnails are rendered in a process pool next to them.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_STORAGE_DIR = os.getenv("ATTACHMENT_STORAGE_DIR", "attachments")
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_SIZE = (320, 320)
+
+
+class ObjectTooLarge(Exception):
+    pass
+
+
+def make_thumbnail(source: str, destination: str, size=THUMBNAIL_SIZE) -> bool:
+    """Render a JPEG thumbnail. Runs in a worker process."""
+    from PIL import Image
+
+    tmp = destination + ".tmp"
+    with Image.open(source) as image:
+        image.thumbnail(size)
+        image.convert("RGB").save(tmp, "JPEG", quality=80)
+    os.replace(tmp, destination)
+    return True
+
+
+class LocalObjectStore:
+    def __init__(self, root: str = ATTACHMENT_STORAGE_DIR, max_bytes: int = ATTACHMENT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._thumbnail_pool = None
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], sha256[2:4], sha256)
+
+    def thumbnail_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "thumbnails", sha256[:2], sha256[2:4], sha256 + ".jpg")
+
+    def delete(self, sha256: str):
+        """Remove an object and its thumbnail; missing files are ignored."""
+        for path in (self.object_path(sha256), self.thumbnail_path(sha256)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def save_stream(self, chunks) -> tuple:
+        """Write an async iterable of byte chunks to the store.
+
+        Only one chunk is held in memory at a time. Returns (sha256, size); if an
+        object with the same hash already exists the new copy is discarded.
+        """
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        os.close(fd)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with await anyio.open_file(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ObjectTooLarge(f"Attachment exceeds {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    await f.write(chunk)
+            sha256 = digest.hexdigest()
+            path = self.object_path(sha256)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def schedule_thumbnail(self, sha256: str):
+        """Queue thumbnail generation off the request path; no-op if it already exists."""
+        destination = self.thumbnail_path(sha256)
+        if os.path.exists(destination):
+            return
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if self._thumbnail_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Spawn, not fork: forking a threaded uvicorn worker can copy a held lock into the child
+            self._thumbnail_pool = ProcessPoolExecutor(
+                max_workers=THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        future = self._thumbnail_pool.submit(make_thumbnail, self.object_path(sha256), destination)
+        future.add_done_callback(lambda f: f.exception() and logger.warning(
+            f"Thumbnail generation failed for {sha256}: {f.exception()}"
+        ))
+
+    def shutdown(self):
+        if self._thumbnail_pool is not None:
+            self._thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+            self._thumbnail_pool = None
+
+
+store = LocalObjectStore()